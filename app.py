@@ -1,13 +1,10 @@
 import streamlit as st
 import polars as pl
 import altair as alt
+from taxi_common import build_filtered, build_filtered_cube, cube_mean, payment_type_label, sidebar_filters, zone_lookup
 
 st.title("NYC Taxi Data Analysis")
 st.write("This dashboard provides insights into the NYC taxi trips dataset. It includes summary statistics and visualizations to help you understand the data better.")
-@st.cache_data # Cache the data loading function to improve performance
-def load_data():
-    return pl.read_parquet("data/processed/cleaned_trips.parquet") #! Filename may change
-data = load_data()
 
 # Sidebar navigation
 st.sidebar.header("Navigation")
@@ -23,93 +20,71 @@ page = st.sidebar.radio(
     ]
 )
 
-# Sidebar filters
-st.sidebar.header("Filters")
-import pandas as pd
-pickup_hour_pd = data["pickup_hour"].to_pandas()
-min_hour = int(pd.to_numeric(pickup_hour_pd.min(), errors="coerce"))
-max_hour = int(pd.to_numeric(pickup_hour_pd.max(), errors="coerce"))
-hour_range = st.sidebar.slider(
-    "Hour range",
-    min_value=min_hour,
-    max_value=max_hour,
-    value=(min_hour, max_hour)
-)
-all_days = sorted(data["pickup_day_of_week"].unique().to_list())
-selected_days = st.sidebar.multiselect(
-    "Select days of week",
-    options=all_days,
-    default=all_days
-)
-payment_type_map = {
-    1: "Credit Card",
-    2: "Cash",
-    3: "No Charge",
-    4: "Dispute",
-    5: "Unknown"
-}
-all_payment_types = list(payment_type_map.values())
-selected_payment_types = st.sidebar.multiselect(
-    "Select payment types",
-    options=all_payment_types,
-    default=all_payment_types
-)
-selected_payment_codes = [k for k, v in payment_type_map.items() if v in selected_payment_types]
-filtered_data = data.filter(
-    (data["pickup_hour"] >= hour_range[0]) &
-    (data["pickup_hour"] <= hour_range[1]) &
-    (data["pickup_day_of_week"].is_in(selected_days)) &
-    (data["payment_type"].is_in(selected_payment_codes))
-)
+# Cheap, hashable filter key so cached page data never hashes a DataFrame
+filters = sidebar_filters()
 
 @st.cache_data(show_spinner=False)
-def summary_statistics(filtered_data):
+def summary_data(hour_range, selected_days, selected_payment_codes):
+    # One pass over the matching cube cells for the count and all three means
+    return build_filtered_cube(hour_range, selected_days, selected_payment_codes).select([
+        pl.col("trips").sum().alias("n"),
+        cube_mean("trip_distance"),
+        cube_mean("fare_amount"),
+        cube_mean("trip_duration_minutes")
+    ]).collect(streaming=True).row(0)
+
+def summary_statistics(filters):
     st.header("Summary Statistics")
-    st.metric("Total Trips", filtered_data.shape[0])
-    trip_distance_mean = filtered_data["trip_distance"].to_pandas().mean() if filtered_data.shape[0] > 0 else 0
-    fare_amount_mean = filtered_data["fare_amount"].to_pandas().mean() if filtered_data.shape[0] > 0 else 0
-    trip_duration_mean = filtered_data["trip_duration_minutes"].to_pandas().mean() if filtered_data.shape[0] > 0 else 0
-    st.metric("Average Trip Distance (miles)", round(trip_distance_mean, 3) if trip_distance_mean is not None else 0)
-    st.metric("Average Fare Amount ($)", round(fare_amount_mean, 3) if fare_amount_mean is not None else 0)
-    st.metric("Average Trip Duration (minutes)", round(trip_duration_mean, 3) if trip_duration_mean is not None else 0)
+    total_trips, trip_distance_mean, fare_amount_mean, trip_duration_mean = summary_data(*filters)
+    st.metric("Total Trips", total_trips)
+    # The means are undefined (NaN) when nothing matches, so reuse the count from the same pass as the guard
+    st.metric("Average Trip Distance (miles)", round(trip_distance_mean, 3) if total_trips > 0 else 0)
+    st.metric("Average Fare Amount ($)", round(fare_amount_mean, 3) if total_trips > 0 else 0)
+    st.metric("Average Trip Duration (minutes)", round(trip_duration_mean, 3) if total_trips > 0 else 0)
 
 if page == "Summary Statistics":
-    summary_statistics(filtered_data)
+    summary_statistics(filters)
 
 @st.cache_data(show_spinner=False)
-def top_pickup_zones(filtered_data):
-    st.header("Top 10 pickup zones by number of trips")
-    import pandas as pd
-    zone_lookup = pd.read_csv("data/raw/taxi_zone_lookup.csv")
+def top_pickup_zones_data(hour_range, selected_days, selected_payment_codes):
     pickup_zone_counts = (
-        filtered_data.group_by("PULocationID")
-        .agg(pl.count().alias("count"))
+        build_filtered_cube(hour_range, selected_days, selected_payment_codes)
+        .group_by("PULocationID")
+        .agg(pl.col("trips").sum().alias("count"))
         .sort("count", descending=True)
         .head(10)
+        .collect(streaming=True)
     )
-    pickup_zone_counts = pickup_zone_counts.to_pandas()
-    pickup_zone_counts = pickup_zone_counts.merge(
-        zone_lookup[["LocationID", "Zone"]],
+    # The CSV reads LocationID as i64, so match it to the trip file's ID type before joining
+    zones = zone_lookup().with_columns(pl.col("LocationID").cast(pickup_zone_counts.schema["PULocationID"]))
+    return pickup_zone_counts.join(
+        zones,
         left_on="PULocationID",
         right_on="LocationID",
         how="left"
     )
-    st.bar_chart(pickup_zone_counts, x="Zone", y="count")
+
+def top_pickup_zones(filters):
+    st.header("Top 10 pickup zones by number of trips")
+    st.bar_chart(top_pickup_zones_data(*filters), x="Zone", y="count")
 
 if page == "Top Pickup Zones":
-    top_pickup_zones(filtered_data)
+    top_pickup_zones(filters)
 
 @st.cache_data(show_spinner=False)
-def fare_by_hour_page(filtered_data):
-    st.header("Average Fare Amount by Hour of Day")
-    fare_by_hour = (
-        filtered_data.to_pandas()
-        .groupby("pickup_hour", dropna=False)
-        .agg({"fare_amount": "mean"})
-        .reset_index()
+def fare_by_hour_data(hour_range, selected_days, selected_payment_codes):
+    return (
+        build_filtered_cube(hour_range, selected_days, selected_payment_codes)
+        .group_by("pickup_hour")
+        .agg(cube_mean("fare_amount"))
+        .sort("pickup_hour")
+        .collect(streaming=True)
     )
+
+def fare_by_hour_page(filters):
+    st.header("Average Fare Amount by Hour of Day")
     chart = (
-        alt.Chart(fare_by_hour)
+        alt.Chart(fare_by_hour_data(*filters))
         .mark_line()
         .encode(
             x=alt.X("pickup_hour:O", title="Hour of Day"),
@@ -120,43 +95,46 @@ def fare_by_hour_page(filtered_data):
     st.text("We can see that 4-6 AM has the highest average fare amount. The fares at other times are stable.")
 
 if page == "Fare by Hour":
-    fare_by_hour_page(filtered_data)
+    fare_by_hour_page(filters)
 
 @st.cache_data(show_spinner=False)
-def trip_distance_distribution(filtered_data):
-    st.header("Distribution of Trip Distances")
-    import plotly.express as px
-    df_hist = filtered_data.to_pandas()
-    df_hist = df_hist[(df_hist["trip_distance"] >= -1) & (df_hist["trip_distance"] <= 20)]
-    import numpy as np
-    bin_edges = np.arange(0, 20, 0.5)
-    histogram_fig = px.histogram(
-        df_hist,
-        x="trip_distance",
-        category_orders={"trip_distance": bin_edges.tolist()},
-        nbins=len(bin_edges)-1,
-        title="Distribution of Trip Distances (1-20 miles)",
-        labels={"trip_distance": "Trip Distance (miles)", "count": "Number of Trips"}
+def trip_distance_data(hour_range, selected_days, selected_payment_codes):
+    bin_width = 0.5
+    # Bin with plain arithmetic so the whole query stays in the streaming engine and only the
+    # ~40 bar heights leave it. Each bin is labelled by the lower edge of its (a, b] interval.
+    return (
+        build_filtered(hour_range, selected_days, selected_payment_codes)
+        .filter((pl.col("trip_distance") > 0) & (pl.col("trip_distance") <= 20))
+        .select(
+            ((pl.col("trip_distance") / bin_width).ceil() * bin_width - bin_width)
+            .alias("Trip Distance (miles)")
+        )
+        .group_by("Trip Distance (miles)")
+        .agg(pl.len().alias("Number of Trips"))
+        .sort("Trip Distance (miles)")
+        .collect(streaming=True)
     )
-    histogram_fig.update_xaxes(dtick=1, range=[0, 20])
-    histogram_fig.update_layout(bargap=0.1)
-    st.plotly_chart(histogram_fig, use_container_width=True)
+
+def trip_distance_distribution(filters):
+    st.header("Distribution of Trip Distances")
+    st.bar_chart(trip_distance_data(*filters), x="Trip Distance (miles)", y="Number of Trips")
 
 if page == "Trip Distance Distribution":
-    trip_distance_distribution(filtered_data)
+    trip_distance_distribution(filters)
 
 @st.cache_data(show_spinner=False)
-def payment_type_proportion(filtered_data):
-    st.header("Proportion of Trips by Payment Type")
-    payment_type_counts = (
-        filtered_data.to_pandas()
-        .groupby("payment_type", dropna=False)
-        .size()
-        .reset_index(name="count")
+def payment_type_data(hour_range, selected_days, selected_payment_codes):
+    return (
+        build_filtered_cube(hour_range, selected_days, selected_payment_codes)
+        .group_by(payment_type_label)
+        .agg(pl.col("trips").sum().alias("count"))
+        .collect(streaming=True)
     )
-    payment_type_counts["payment_type"] = payment_type_counts["payment_type"].map(payment_type_map)
+
+def payment_type_proportion(filters):
+    st.header("Proportion of Trips by Payment Type")
     pie_chart = (
-        alt.Chart(payment_type_counts)
+        alt.Chart(payment_type_data(*filters))
         .mark_arc()
         .encode(
             theta=alt.Theta("count:Q", title="Number of Trips"),
@@ -167,19 +145,21 @@ def payment_type_proportion(filtered_data):
     st.text("The majority of trips are paid by credit card, followed by cash. A small percentage of trips have unknown payment types. This shows most passengers prefer cashless payments, but there is still a significant portion using cash.")
 
 if page == "Payment Type Proportion":
-    payment_type_proportion(filtered_data)
+    payment_type_proportion(filters)
 
 @st.cache_data(show_spinner=False)
-def fare_heatmap_page(filtered_data):
-    st.header("Average Fare Amount by Pickup Hour and Day of Week")
-    fare_heatmap = (
-        filtered_data.to_pandas()
-        .groupby(["pickup_hour", "pickup_day_of_week"], dropna=False)
-        .agg({"fare_amount": "mean"})
-        .reset_index()
+def fare_heatmap_data(hour_range, selected_days, selected_payment_codes):
+    return (
+        build_filtered_cube(hour_range, selected_days, selected_payment_codes)
+        .group_by(["pickup_hour", "pickup_day_of_week"])
+        .agg(cube_mean("fare_amount"))
+        .collect(streaming=True)
     )
+
+def fare_heatmap_page(filters):
+    st.header("Average Fare Amount by Pickup Hour and Day of Week")
     heatmap = (
-        alt.Chart(fare_heatmap)
+        alt.Chart(fare_heatmap_data(*filters))
         .mark_rect()
         .encode(
             x=alt.X("pickup_hour:O", title="Hour of Day"),
@@ -195,4 +175,4 @@ def fare_heatmap_page(filtered_data):
     st.text("The heatmap shows that Wednesday 4AM has a tremendously high average fare amount, which is likely due to a small number of trips with very high fares. Other than that, the average fare amounts are relatively stable across different hours and days, with slightly higher fares during early morning hours (4-6 AM) on weekdays.")
 
 if page == "Fare Heatmap":
-    fare_heatmap_page(filtered_data)
\ No newline at end of file
+    fare_heatmap_page(filters)
\ No newline at end of file
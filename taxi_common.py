@@ -0,0 +1,85 @@
+import streamlit as st
+import polars as pl
+
+payment_type_map = {
+    1: "Credit Card",
+    2: "Cash",
+    3: "No Charge",
+    4: "Dispute",
+    5: "Unknown"
+}
+# Maps payment codes to their labels inside the query instead of in pandas
+payment_type_label = pl.col("payment_type").replace(payment_type_map).alias("payment_type")
+
+@st.cache_resource # One shared LazyFrame handle for the app process, so the Parquet footer is only read once
+def load_data():
+    # Lazy scan so filters and column selections are pushed down into the Parquet reader.
+    # low_memory keeps streaming collects bounded to a row group at a time. Row groups are
+    # decoded in parallel, and their statistics let the hour filter skip row groups outright
+    # because the notebook writes the file sorted by pickup_hour.
+    return pl.scan_parquet(
+        "data/processed/cleaned_trips.parquet", #! Filename may change
+        low_memory=True,
+        parallel="row_groups",
+        use_statistics=True
+    )
+
+@st.cache_resource
+def load_cube():
+    # Per (hour, day, payment type, pickup zone) sums and trip counts built by the notebook
+    return pl.scan_parquet("data/processed/trip_cube.parquet")
+
+@st.cache_resource # Shared as-is rather than pickled and copied on every cache hit
+def zone_lookup():
+    return pl.read_csv("data/raw/taxi_zone_lookup.csv").select(["LocationID", "Zone"])
+
+@st.cache_data # Widget bounds only depend on the file, so compute them once in a single scan
+def widget_stats():
+    return load_cube().select([
+        pl.col("pickup_hour").min().alias("min_hour"),
+        pl.col("pickup_hour").max().alias("max_hour"),
+        pl.col("pickup_day_of_week").unique().cast(pl.Utf8).sort().implode()
+    ]).collect(streaming=True).row(0)
+
+def sidebar_filters():
+    st.sidebar.header("Filters")
+    min_hour, max_hour, all_days = widget_stats()
+    hour_range = st.sidebar.slider(
+        "Hour range",
+        min_value=min_hour,
+        max_value=max_hour,
+        value=(min_hour, max_hour)
+    )
+    selected_days = st.sidebar.multiselect(
+        "Select days of week",
+        options=all_days,
+        default=all_days
+    )
+    all_payment_types = list(payment_type_map.values())
+    selected_payment_types = st.sidebar.multiselect(
+        "Select payment types",
+        options=all_payment_types,
+        default=all_payment_types
+    )
+    selected_payment_codes = [k for k, v in payment_type_map.items() if v in selected_payment_types]
+    # Sorted tuples keep the filter key hashable and stable for st.cache_data
+    return tuple(hour_range), tuple(sorted(selected_days)), tuple(sorted(selected_payment_codes))
+
+def filter_expr(hour_range, selected_days, selected_payment_codes):
+    return (
+        (pl.col("pickup_hour") >= hour_range[0]) &
+        (pl.col("pickup_hour") <= hour_range[1]) &
+        # Typed as strings so an empty selection still compares against the categorical column
+        (pl.col("pickup_day_of_week").is_in(pl.Series(selected_days, dtype=pl.Utf8))) &
+        (pl.col("payment_type").is_in(list(selected_payment_codes)))
+    )
+
+def build_filtered(hour_range, selected_days, selected_payment_codes):
+    return load_data().filter(filter_expr(hour_range, selected_days, selected_payment_codes))
+
+def build_filtered_cube(hour_range, selected_days, selected_payment_codes):
+    return load_cube().filter(filter_expr(hour_range, selected_days, selected_payment_codes))
+
+def cube_mean(column):
+    # Recombines the cube's partial sums into the mean over all matching trips
+    return (pl.col(column).sum() / pl.col("trips").sum()).alias(column)